@@ -6,6 +6,7 @@ It includes the base FirewallBehaviour and the specialized RouterFirewallBehavio
 """
 
 from typing import Optional, Set, Dict, Any
+import re
 import asyncio
 import time
 from spade.behaviour import CyclicBehaviour
@@ -41,6 +42,7 @@ class FirewallBehaviour(CyclicBehaviour):
         self.temp_blocks: Dict[str, float] = {}
         self.suspended_accounts: Set[str] = set()
         self._command_lock = asyncio.Lock()  # Lock to prevent concurrent modification of rules
+        self.rules_updated = asyncio.Event()  # Set whenever a control message changes the rules
 
     # Runtime rule management
     def block_jid(self, jid: str):
@@ -240,7 +242,13 @@ class FirewallBehaviour(CyclicBehaviour):
         return True
 
     async def _handle_control(self, msg: Message):
-        """Process firewall control command and send confirmation reply.
+        """Process firewall control command(s) and send a confirmation reply.
+
+        A control body may carry several directives separated by ';' or by
+        newlines (e.g. ``BLOCK_JID:jid;QUARANTINE_ADVISORY:incident_3``, or
+        bodies coalesced by the response agent's send queue). Each directive is
+        applied in order and a single reply with one status line per directive
+        is sent back.
 
         Supported commands:
         - BLOCK_JID:jid
@@ -260,123 +268,114 @@ class FirewallBehaviour(CyclicBehaviour):
         Returns:
             None: Sends a reply message with OK/ERROR status asynchronously.
         """
-        body = (msg.body or "").strip()
+        directives = [d.strip() for d in re.split(r"[;\n]", msg.body or "")]
+        replies = [self._apply_control(d) for d in directives if d] or [self._apply_control("")]
+        self.rules_updated.set()
+
         reply = Message(to=str(msg.sender))
         reply.set_metadata("protocol", "firewall-control")
+        reply.body = "\n".join(replies)
+        await self.send(reply)
+
+    def _apply_control(self, body: str) -> str:
+        """Apply a single firewall control directive.
+
+        Args:
+            body (str): One directive, e.g. 'BLOCK_JID:attacker0@localhost'.
+
+        Returns:
+            str: OK/ERROR status line describing the outcome.
+        """
+        command = body.upper()
 
         # BLOCK_JID - Permanent block
-        if body.upper().startswith("BLOCK_JID:"):
+        if command.startswith("BLOCK_JID:"):
             jid = body.split(":", 1)[1].strip()
             self.block_jid(jid)
-            reply.body = f"OK BLOCKED {jid}"
-            await self.send(reply)
-            return
+            return f"OK BLOCKED {jid}"
 
         # UNBLOCK_JID - Remove permanent block
-        if body.upper().startswith("UNBLOCK_JID:"):
+        if command.startswith("UNBLOCK_JID:"):
             jid = body.split(":", 1)[1].strip()
             self.unblock_jid(jid)
-            reply.body = f"OK UNBLOCKED {jid}"
-            await self.send(reply)
-            return
+            return f"OK UNBLOCKED {jid}"
 
         # BLOCK_KEY - Block keyword
-        if body.upper().startswith("BLOCK_KEY:"):
+        if command.startswith("BLOCK_KEY:"):
             kw = body.split(":", 1)[1].strip()
             self.block_keyword(kw)
-            reply.body = f"OK BLOCKED_KEY {kw}"
-            await self.send(reply)
-            return
+            return f"OK BLOCKED_KEY {kw}"
 
         # UNBLOCK_KEY - Remove keyword block
-        if body.upper().startswith("UNBLOCK_KEY:"):
+        if command.startswith("UNBLOCK_KEY:"):
             kw = body.split(":", 1)[1].strip()
             self.unblock_keyword(kw)
-            reply.body = f"OK UNBLOCKED_KEY {kw}"
-            await self.send(reply)
-            return
+            return f"OK UNBLOCKED_KEY {kw}"
 
         # RATE_LIMIT - Throttle messages per second
-        if body.upper().startswith("RATE_LIMIT:"):
+        if command.startswith("RATE_LIMIT:"):
             parts = body.split(":")
-            if len(parts) >= 3:
-                jid = parts[1].strip()
-                rate_str = parts[2].strip().upper().replace("MSG/S", "").strip()
-                try:
-                    max_per_sec = int(rate_str)
-                    self.rate_limits[jid] = {
-                        "max_per_sec": max_per_sec,
-                        "count": 0,
-                        "last_reset": time.time()
-                    }
-                    reply.body = f"OK RATE_LIMITED {jid} to {max_per_sec} msg/s"
-                    print(f"[FIREWALL {self.agent.jid}] Rate limit applied: {jid} -> {max_per_sec} msg/s")
-                except ValueError:
-                    reply.body = f"ERROR Invalid rate format: {rate_str}"
-            else:
-                reply.body = "ERROR Invalid RATE_LIMIT format (use RATE_LIMIT:jid:10msg/s)"
-            await self.send(reply)
-            return
+            if len(parts) < 3:
+                return "ERROR Invalid RATE_LIMIT format (use RATE_LIMIT:jid:10msg/s)"
+            jid = parts[1].strip()
+            rate_str = parts[2].strip().upper().replace("MSG/S", "").strip()
+            try:
+                max_per_sec = int(rate_str)
+            except ValueError:
+                return f"ERROR Invalid rate format: {rate_str}"
+            self.rate_limits[jid] = {
+                "max_per_sec": max_per_sec,
+                "count": 0,
+                "last_reset": time.time()
+            }
+            print(f"[FIREWALL {self.agent.jid}] Rate limit applied: {jid} -> {max_per_sec} msg/s")
+            return f"OK RATE_LIMITED {jid} to {max_per_sec} msg/s"
 
         # TEMP_BLOCK - Temporary block with expiration
-        if body.upper().startswith("TEMP_BLOCK:"):
+        if command.startswith("TEMP_BLOCK:"):
             parts = body.split(":")
-            if len(parts) >= 3:
-                jid = parts[1].strip()
-                duration_str = parts[2].strip().upper().replace("S", "").strip()
-                try:
-                    duration_sec = int(duration_str)
-                    expiry = time.time() + duration_sec
-                    self.temp_blocks[jid] = expiry
-                    reply.body = f"OK TEMP_BLOCKED {jid} for {duration_sec}s"
-                    print(f"[FIREWALL {self.agent.jid}] Temporary block: {jid} for {duration_sec}s")
-                except ValueError:
-                    reply.body = f"ERROR Invalid duration format: {duration_str}"
-            else:
-                reply.body = "ERROR Invalid TEMP_BLOCK format (use TEMP_BLOCK:jid:15s)"
-            await self.send(reply)
-            return
+            if len(parts) < 3:
+                return "ERROR Invalid TEMP_BLOCK format (use TEMP_BLOCK:jid:15s)"
+            jid = parts[1].strip()
+            duration_str = parts[2].strip().upper().replace("S", "").strip()
+            try:
+                duration_sec = int(duration_str)
+            except ValueError:
+                return f"ERROR Invalid duration format: {duration_str}"
+            self.temp_blocks[jid] = time.time() + duration_sec
+            print(f"[FIREWALL {self.agent.jid}] Temporary block: {jid} for {duration_sec}s")
+            return f"OK TEMP_BLOCKED {jid} for {duration_sec}s"
 
         # SUSPEND_ACCESS - Suspend account (reversible)
-        if body.upper().startswith("SUSPEND_ACCESS:"):
+        if command.startswith("SUSPEND_ACCESS:"):
             jid = body.split(":", 1)[1].strip()
             self.suspended_accounts.add(jid)
-            reply.body = f"OK SUSPENDED {jid}"
             print(f"[FIREWALL {self.agent.jid}] Account suspended: {jid}")
-            await self.send(reply)
-            return
+            return f"OK SUSPENDED {jid}"
 
         # UNSUSPEND_ACCESS - Restore suspended account
-        if body.upper().startswith("UNSUSPEND_ACCESS:"):
+        if command.startswith("UNSUSPEND_ACCESS:"):
             jid = body.split(":", 1)[1].strip()
             self.suspended_accounts.discard(jid)
-            reply.body = f"OK UNSUSPENDED {jid}"
             print(f"[FIREWALL {self.agent.jid}] Account unsuspended: {jid}")
-            await self.send(reply)
-            return
+            return f"OK UNSUSPENDED {jid}"
 
         # QUARANTINE_ADVISORY - Log quarantine recommendation (informational)
-        if body.upper().startswith("QUARANTINE_ADVISORY:"):
+        if command.startswith("QUARANTINE_ADVISORY:"):
             # Silently acknowledge - nodes could implement isolation procedures here
-            reply.body = "OK QUARANTINE_ACKNOWLEDGED"
-            await self.send(reply)
-            return
+            return "OK QUARANTINE_ACKNOWLEDGED"
 
         # LIST - Show all active rules
-        if body.upper() == "LIST":
+        if command == "LIST":
             lines = ["BLOCKED_JIDS:"] + list(self.blocked_jids)
             lines += ["BLOCKED_KEYWORDS:"] + list(self.blocked_keywords)
             lines += ["SUSPENDED_ACCOUNTS:"] + list(self.suspended_accounts)
             lines += ["RATE_LIMITS:"] + [f"{jid}: {data['max_per_sec']} msg/s" for jid, data in self.rate_limits.items()]
             lines += ["TEMP_BLOCKS:"] + [f"{jid}: expires {data - time.time():.1f}s" for jid, data in self.temp_blocks.items()]
-            reply.body = "\n".join(lines)
-            await self.send(reply)
-            return
+            return "\n".join(lines)
 
         # Unknown command
-        reply.body = f"ERROR Unknown firewall command: {body.split(':')[0]}"
-        await self.send(reply)
-
+        return f"ERROR Unknown firewall command: {body.split(':')[0]}"
 
     async def run(self):
         """Listen for and process firewall control messages.
@@ -12,7 +12,9 @@ import argparse
 import asyncio
 import datetime
 import getpass
+import random
 from collections import defaultdict, deque
+from functools import lru_cache
 from typing import Deque, Dict, List, Any
 
 import spade
@@ -33,6 +35,16 @@ def _log(agent_type: str, jid: str, msg: str) -> None:
     print(f"[{ts}] [{agent_type} {jid}] {msg}")
 
 
+@lru_cache(maxsize=256)
+def _detection_rate(num_reasons: int, intensity: int) -> int:
+    """Return the percentage chance of detecting a suspicious message.
+
+    More reasons = higher detection, higher intensity = lower detection.
+    Base 60%, +15% per reason, -5% per intensity level, clamped to 20-95%.
+    """
+    return min(95, max(20, 60 + num_reasons * 15 - intensity * 5))
+
+
 class MonitoringAgent(Agent):
     """Agent that monitors network messages and generates alerts using CNP."""
 
@@ -385,18 +397,12 @@ class MonitoringAgent(Agent):
 
             if suspicious:
                 # Probabilistic detection - sophisticated attackers may evade detection
-                import random
-
                 # Extract attacker intensity to adjust detection probability
                 attacker_intensity = msg.get_metadata("attacker_intensity")
                 intensity_value = int(attacker_intensity) if attacker_intensity else 5
 
-                # Calculate detection probability based on threat indicators AND attacker skill
-                # More reasons = higher detection, higher intensity = lower detection
-                base_detection_rate = 60  # Base 60% chance
-                detection_bonus = len(reasons) * 15  # +15% per reason
-                intensity_penalty = intensity_value * 5  # -5% per intensity level
-                detection_rate = min(95, max(20, base_detection_rate + detection_bonus - intensity_penalty))
+                # Detection probability based on threat indicators AND attacker skill
+                detection_rate = _detection_rate(len(reasons), intensity_value)
 
                 if detection_rate >= 40:
                     detected = True
@@ -419,10 +425,6 @@ class MonitoringAgent(Agent):
                 else:
                     return
 
-                # Extract intensity from message metadata if available
-                attacker_intensity = msg.get_metadata("attacker_intensity")
-                intensity_value = int(attacker_intensity) if attacker_intensity else 5
-
                 alert = {
                     "time": datetime.datetime.now().isoformat(),
                     "sender": sender,
@@ -25,6 +25,22 @@ from spade.behaviour import CyclicBehaviour, PeriodicBehaviour
 from spade.message import Message
 from firewall import FirewallBehaviour
 
+try:
+    import orjson  # Optional C-accelerated codec for task metadata
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj) -> str:
+    """Serialize to a JSON string, using orjson when installed."""
+    return orjson.dumps(obj).decode() if orjson else json.dumps(obj)
+
+
+_json_loads = orjson.loads if orjson else json.loads
+
+# Bound once: percentage rolls run on every spread/infection/cure attempt
+_rand = random.random
+
 
 def _now_ts():
     """Return a monotonic timestamp from the asyncio event loop.
@@ -87,8 +103,7 @@ class NodeAgent(Agent):
             intensity = self.agent.get("compromised_intensity") or 6
             spread_success_rate = min(95, intensity * 10)  # 10% at intensity=1, 95% at intensity=9+
 
-            import random
-            if random.randint(1, 100) > spread_success_rate:
+            if int(_rand() * 100) + 1 > spread_success_rate:
                 # Failed to spread - insufficient privileges, detected by local security, etc.
                 _log("NodeAgent", str(self.agent.jid),
                      f"[SPREAD FAILED] Lateral movement blocked (success rate: {spread_success_rate}%)")
@@ -105,7 +120,6 @@ class NodeAgent(Agent):
             # Pick target(s) based on intensity
             targets_count = 1 if intensity < 7 else min(2, len(available_targets))
 
-            import random
             targets = random.sample(available_targets, min(targets_count, len(available_targets)))
 
             for target in targets:
@@ -179,7 +193,7 @@ class NodeAgent(Agent):
                 "cpu_load": 20.0,
                 "duration": 10.0
             }
-            msg.set_metadata("task", json.dumps(task_data))
+            msg.set_metadata("task", _json_dumps(task_data))
 
             await self.send(msg)
 
@@ -282,7 +296,7 @@ class NodeAgent(Agent):
                     try:
                         if msg.metadata and "task" in msg.metadata:
                             raw = msg.metadata.get("task")
-                            task_info = json.loads(raw) if isinstance(raw, str) else raw
+                            task_info = _json_loads(raw) if isinstance(raw, str) else raw
                     except Exception:
                         task_info = None
 
@@ -416,10 +430,9 @@ class NodeAgent(Agent):
                         attacker_intensity = int(msg.get_metadata("spread_intensity") or 7)
 
                         # Probabilistic lateral infection success (network security, endpoint protection, etc.)
-                        import random
                         infection_success_rate = min(90, 40 + (attacker_intensity * 5))  # 45% to 90%
 
-                        if random.randint(1, 100) > infection_success_rate:
+                        if int(_rand() * 100) + 1 > infection_success_rate:
                             _log("NodeAgent", str(self.agent.jid),
                                  f"[BLOCKED] Lateral infection attempt from {source_node} blocked by local security ({infection_success_rate}% success rate)")
                             return
@@ -467,8 +480,7 @@ class NodeAgent(Agent):
                              f"HARD RESET INITIATED: Attempting to remove {malware_type} (intensity={attacker_intensity}, success_rate={cure_success_rate:.0f}%)")
 
                         # Probabilistic cure
-                        import random
-                        if random.random() * 100 < cure_success_rate:
+                        if _rand() * 100 < cure_success_rate:
                             # SUCCESS: Perform hard reset
                             active_tasks = self.agent.get("active_tasks") or {}
                             num_tasks_cleared = len(active_tasks)
@@ -509,8 +521,7 @@ class NodeAgent(Agent):
                         _log("NodeAgent", str(self.agent.jid),
                              f"FORENSIC CLEAN INITIATED: Attempting to remove {backdoor_type} (intensity={intensity}, success_rate={clean_success_rate:.0f}%)")
 
-                        import random
-                        if random.random() * 100 < clean_success_rate:
+                        if _rand() * 100 < clean_success_rate:
                             # SUCCESS: Remove backdoor
                             self.agent.set("compromised", False)
                             self.agent.set("backdoor_type", None)
@@ -8,9 +8,12 @@ import argparse
 import asyncio
 import datetime
 import getpass
-from collections import defaultdict
+import logging
+import sys
+from collections import defaultdict, deque
 from operator import truediv
-from typing import Dict, Any, List
+from enum import IntEnum
+from typing import Dict, Any, List, Optional, Tuple
 import random
 import spade
 from spade.agent import Agent
@@ -18,21 +21,56 @@ from spade.behaviour import CyclicBehaviour, PeriodicBehaviour
 from spade.message import Message
 
 
-def _log(agent_type: str, jid: str, msg: str) -> None:
+logger = logging.getLogger("response")
+
+
+def _ensure_console_logging() -> None:
+    """Attach a stdout handler to the "response" logger unless logging is already configured.
+
+    Called at agent setup rather than import time, so an application that configures
+    root logging itself receives these records through normal propagation instead.
+    """
+    # Default to INFO like the other agents' console output, unless a level was chosen explicitly
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    if logger.handlers or logging.getLogger().handlers:
+        return
+    # Keep the "[HH:MM:SS] [Type jid] msg" console format used by the other agents
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%H:%M:%S"))
+    logger.addHandler(handler)
+
+
+def _log(agent_type: str, jid: str, msg: str, *args: Any, level: int = logging.INFO) -> None:
     """Log a message with timestamp, agent type, and JID.
 
+    Formatting is deferred to the `logging` module, so `%`-style arguments are
+    only interpolated when the given level is enabled.
+
     Args:
         agent_type (str): The type of the agent (e.g., "IncidentResponse").
         jid (str): The JID of the agent instance.
-        msg (str): The message content to display.
+        msg (str): The message content to display (`%`-style template).
+        *args (Any): Values interpolated into `msg`.
+        level (int): Logging level (defaults to INFO).
     """
-    ts = datetime.datetime.now().strftime("%H:%M:%S")
-    print(f"[{ts}] [{agent_type} {jid}] {msg}")
+    logger.log(level, "[%s %s] " + msg, agent_type, jid, *args)
+
+
+class IncidentStatus(IntEnum):
+    """Lifecycle of an incident in `active_incidents`; finished states compare >= RESOLVED."""
+    MITIGATING = 0
+    RESOLVED = 1
+    FAILED = 2
 
 
 class IncidentResponseAgent(Agent):
     """CNP Participant that bids on incident response tasks."""
 
+    # Multiplier for the simulated investigation/containment/eradication phase durations.
+    # 1.0 keeps the simulation's intensity-based timings; 0 removes the artificial latency.
+    MITIGATION_TIME_SCALE = 1.0
+
     class CleanupBehaviour(PeriodicBehaviour):
         async def run(self):
             """Removes completed incidents from the `active_incidents` dictionary after a 5-second cooldown."""
@@ -41,7 +79,7 @@ class IncidentResponseAgent(Agent):
             to_remove = []
 
             for inc_id, inc_data in incidents.items():
-                if inc_data.get("status") in ["resolved", "failed"]:
+                if inc_data["status"] >= IncidentStatus.RESOLVED:
                     if "end_time" in inc_data:
                         end_time = datetime.datetime.fromisoformat(inc_data["end_time"])
                         if (now - end_time).total_seconds() >= 5.0:
@@ -49,10 +87,9 @@ class IncidentResponseAgent(Agent):
 
             if to_remove:
                 for inc_id in to_remove:
-                    del incidents[inc_id]
-                self.agent.set("active_incidents", incidents)
-                _log("IncidentResponse", str(self.agent.jid),
-                     f"Cleaned up {len(to_remove)} completed incidents")
+                    del incidents[inc_id]  # mutates the dict held in the KV store in place
+                _log("IncidentResponse", self.agent._jid_str,
+                     "Cleaned up %d completed incidents", len(to_remove))
 
     class ResourceBehaviour(PeriodicBehaviour):
         async def run(self):
@@ -61,7 +98,7 @@ class IncidentResponseAgent(Agent):
             Each active mitigation task adds 15.0% to the CPU load, up to 100%.
             """
             incidents = self.agent.get("active_incidents") or {}
-            active_count = sum(1 for inc in incidents.values() if inc.get("status") == "mitigating")
+            active_count = sum(1 for inc in incidents.values() if inc["status"] == IncidentStatus.MITIGATING)
             base_cpu = 10.0
             incident_cpu = active_count * 15.0
             cpu_usage = min(100.0, base_cpu + incident_cpu)
@@ -69,28 +106,94 @@ class IncidentResponseAgent(Agent):
             self.agent.set("cpu_usage", cpu_usage)
             self.agent.set("bandwidth_usage", min(100.0, 3.0 + active_count * 5.0))
 
+            self.agent._refresh_availability()
+
             if active_count > 0:
-                _log("IncidentResponse", str(self.agent.jid),
-                     f"Resources: cpu={cpu_usage:.1f}% active_incidents={active_count}")
+                _log("IncidentResponse", self.agent._jid_str,
+                     "Resources: cpu=%.1f%% active_incidents=%d", cpu_usage, active_count)
 
     class CNPParticipantBehaviour(CyclicBehaviour):
+        FW_FLUSH_WINDOW = 0.005  # seconds to wait for more control directives to the same node
+
         async def on_start(self):
-            """Initializes the CNP participant behavior."""
-            _log("IncidentResponse", str(self.agent.jid), "CNP Participant behaviour started")
+            """Initializes the CNP participant behavior and its mitigation dispatch table."""
+            _log("IncidentResponse", self.agent._jid_str, "CNP Participant behaviour started")
+            self._mitigators = {
+                "malware": self._mitigate_malware,
+                "resource_anomaly": self._mitigate_malware,
+                "ddos": self._mitigate_ddos,
+                "insider_threat": self._mitigate_insider,
+            }
+            self._pending_fw: Dict[str, List[str]] = {}  # destination JID -> queued firewall-control bodies
+            self._flush_task = None
+            self._inflight = set()  # strong refs so pending handler tasks are not garbage collected
+
+        def _spawn(self, coro) -> asyncio.Task:
+            """Runs `coro` as a background task tracked in `_inflight` until it finishes."""
+            task = asyncio.create_task(coro)
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            return task
+
+        async def _phase(self, seconds: float) -> None:
+            """Waits out a simulated mitigation phase, scaled by the agent's MITIGATION_TIME_SCALE.
+
+            A scale of 0 skips the wait entirely (no event-loop round trip).
+            """
+            scale = self.agent.MITIGATION_TIME_SCALE
+            if scale:
+                await asyncio.sleep(seconds * scale)
+
+        def _queue_fw(self, jid: str, body: str) -> asyncio.Task:
+            """Queues a firewall-control directive for `jid`, coalescing bursts into one message.
+
+            Directives queued for the same destination within FW_FLUSH_WINDOW seconds are
+            sent together as a single newline-separated body (the firewall applies each line).
+
+            Returns:
+                asyncio.Task: The flush that will send this directive; pass it to `_await_fw`.
+            """
+            self._pending_fw.setdefault(jid, []).append(body)
+            if self._flush_task is None:
+                self._flush_task = self._spawn(self._flush_fw())
+            return self._flush_task
+
+        async def _await_fw(self, flush: Optional[asyncio.Task]) -> None:
+            """Waits until `flush` (as returned by `_queue_fw`) has sent its directives.
+
+            Shielded, so cancelling one mitigation never drops directives queued by another.
+            """
+            if flush is not None:
+                await asyncio.shield(flush)
+
+        async def _flush_fw(self) -> None:
+            """Sends one firewall-control message per destination after the flush window."""
+            await asyncio.sleep(self.FW_FLUSH_WINDOW)
+            pending, self._pending_fw = self._pending_fw, {}
+            self._flush_task = None
+            batch = []
+            for jid, bodies in pending.items():
+                ctrl = Message(to=jid)
+                ctrl.set_metadata("protocol", "firewall-control")
+                ctrl.body = "\n".join(bodies)
+                batch.append(ctrl)
+            results = await asyncio.gather(*(self.send(m) for m in batch), return_exceptions=True)
+            for ctrl, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    _log("IncidentResponse", self.agent._jid_str, "Failed to send firewall-control to %s: %s",
+                         str(ctrl.to), result, level=logging.WARNING)
 
         def calculate_availability_score(self) -> float:
-            """Calculates the agent's availability score for bidding in a CNP auction.
+            """Returns the agent's availability score for bidding in a CNP auction.
 
             The score reflects the current CPU usage plus a penalty for each currently
-            active incident being mitigated. Lower score wins.
+            active incident being mitigated. Lower score wins. The value is precomputed
+            by `IncidentResponseAgent._refresh_availability` whenever its inputs change.
 
             Returns:
                 float: The availability score.
             """
-            cpu = float(self.agent.get("cpu_usage") or 20.0)
-            incidents = self.agent.get("active_incidents") or {}
-            active = sum(1 for inc in incidents.values() if inc.get("status") == "mitigating")
-            return cpu + active * 10.0
+            return self.agent._cached_score
 
         async def handle_cfp(self, msg: Message):
             """Processes a Call for Proposal (CFP) message from a monitoring agent.
@@ -103,10 +206,10 @@ class IncidentResponseAgent(Agent):
             """
             incident_id = msg.get_metadata("incident_id")
             threat_type = msg.get_metadata("threat_type")
+            sender_jid = str(msg.sender)
 
             # Check if we have capacity for a new incident (15% CPU each)
-            incidents = self.agent.get("active_incidents") or {}
-            active_count = sum(1 for inc in incidents.values() if inc.get("status") == "mitigating")
+            active_count = self.agent._mitigating_count
             current_cpu = 10.0 + (active_count * 15.0)
 
             if current_cpu > 85.0:
@@ -114,10 +217,11 @@ class IncidentResponseAgent(Agent):
                 refused_count = self.agent.get("refused_cfps") or 0
                 self.agent.set("refused_cfps", refused_count + 1)
 
-                _log("IncidentResponse", str(self.agent.jid),
-                     f"REFUSED CFP for incident {incident_id}: CPU={current_cpu:.1f}% ({active_count} active incidents, no capacity)")
+                _log("IncidentResponse", self.agent._jid_str,
+                     "REFUSED CFP for incident %s: CPU=%.1f%% (%d active incidents, no capacity)",
+                     incident_id, current_cpu, active_count)
 
-                refuse = Message(to=str(msg.sender))
+                refuse = Message(to=sender_jid)
                 refuse.set_metadata("protocol", "cnp-refuse")
                 refuse.set_metadata("incident_id", incident_id)
                 refuse.set_metadata("performative", "REFUSE")
@@ -126,16 +230,18 @@ class IncidentResponseAgent(Agent):
                 return
 
             score = self.calculate_availability_score()
-            _log("IncidentResponse", str(self.agent.jid), f"Received CFP for incident {incident_id}: {threat_type} (CPU={current_cpu:.1f}%)")
+            _log("IncidentResponse", self.agent._jid_str, "Received CFP for incident %s: %s (CPU=%.1f%%)",
+                 incident_id, threat_type, current_cpu)
 
-            proposal = Message(to=str(msg.sender))
+            proposal = Message(to=sender_jid)
             proposal.set_metadata("protocol", "cnp-propose")
             proposal.set_metadata("incident_id", incident_id)
             proposal.set_metadata("performative", "PROPOSE")
             proposal.set_metadata("availability_score", str(score))
             proposal.body = f"Proposal for incident {incident_id}"
             await self.send(proposal)
-            _log("IncidentResponse", str(self.agent.jid), f"Sent proposal for incident {incident_id} with score {score:.2f}")
+            _log("IncidentResponse", self.agent._jid_str, "Sent proposal for incident %s with score %.2f",
+                 incident_id, score)
 
         async def handle_accept_proposal(self, msg: Message):
             """Processes an ACCEPT_PROPOSAL message, signaling the agent has won the contract.
@@ -154,24 +260,26 @@ class IncidentResponseAgent(Agent):
             intensity = int(intensity_str) if intensity_str else 5
             monitor_jid = str(msg.sender)
 
-            _log("IncidentResponse", str(self.agent.jid),
-                 f"WON contract for incident {incident_id}! Executing mitigation...")
+            _log("IncidentResponse", self.agent._jid_str,
+                 "WON contract for incident %s! Executing mitigation...", incident_id)
 
+            started_at = datetime.datetime.now()  # one clock read shared by the incident record and history
             incidents = self.agent.get("active_incidents") or {}
             incidents[incident_id] = {
                 "threat_type": threat_type,
                 "offender_jid": offender_jid,
                 "victim_jid": victim_jid,
                 "intensity": intensity,
-                "start_time": datetime.datetime.now().isoformat(),
-                "status": "mitigating"
+                "start_time": started_at.isoformat(),
+                "status": IncidentStatus.MITIGATING
             }
             self.agent.set("active_incidents", incidents)
+            self.agent._refresh_availability()
 
             # Run mitigation asynchronously so we can continue receiving CFPs
-            asyncio.create_task(self._execute_mitigation_async(incident_id, threat_type, offender_jid, victim_jid, intensity, monitor_jid))
+            self._spawn(self._execute_mitigation_async(incident_id, threat_type, offender_jid, victim_jid, intensity, monitor_jid, started_at))
 
-        async def _execute_mitigation_async(self, incident_id: str, threat_type: str, offender_jid: str, victim_jid: str, intensity: int, monitor_jid: str):
+        async def _execute_mitigation_async(self, incident_id: str, threat_type: str, offender_jid: str, victim_jid: str, intensity: int, monitor_jid: str, started_at: datetime.datetime = None):
             """Wrapper to execute mitigation and inform the monitor of the result.
 
             This is run as a separate task to maintain responsiveness to new CFPs.
@@ -183,14 +291,16 @@ class IncidentResponseAgent(Agent):
                 victim_jid (str): The victim's JID.
                 intensity (int): The attacker's intensity level.
                 monitor_jid (str): The JID of the monitoring agent that awarded the contract.
+                started_at (datetime.datetime, optional): When the contract was accepted.
             """
-            success = await self.execute_mitigation(incident_id, threat_type, offender_jid, victim_jid, intensity)
+            success = await self.execute_mitigation(incident_id, threat_type, offender_jid, victim_jid, intensity, started_at)
 
             incidents = self.agent.get("active_incidents") or {}
             if incident_id in incidents:
-                incidents[incident_id]["status"] = "resolved" if success else "failed"
+                incidents[incident_id]["status"] = IncidentStatus.RESOLVED if success else IncidentStatus.FAILED
                 incidents[incident_id]["end_time"] = datetime.datetime.now().isoformat()
-                self.agent.set("active_incidents", incidents)
+                # Same dict object already lives in the KV store; no need to set() it again
+                self.agent._refresh_availability()
 
             inform = Message(to=monitor_jid)
             inform.set_metadata("protocol", "cnp-inform")
@@ -199,9 +309,11 @@ class IncidentResponseAgent(Agent):
             inform.set_metadata("status", "success" if success else "failure")
             inform.body = f"Incident {incident_id} {'resolved' if success else 'failed'}"
             await self.send(inform)
-            _log("IncidentResponse", str(self.agent.jid), f"Sent INFORM for incident {incident_id}: {'SUCCESS' if success else 'FAILURE'}")
+            _log("IncidentResponse", self.agent._jid_str, "Sent INFORM for incident %s: %s",
+                 incident_id, "SUCCESS" if success else "FAILURE")
 
-        async def execute_mitigation(self, incident_id: str, threat_type: str, offender_jid: str, victim_jid: str = None, intensity: int =None) -> bool:
+        async def execute_mitigation(self, incident_id: str, threat_type: str, offender_jid: str, victim_jid: str = None, intensity: int =None,
+                                     started_at: datetime.datetime = None) -> bool:
             """Executes the specific mitigation steps based on the threat type.
 
             Mitigation is structured in phases (Investigation, Containment/Mitigation, Eradication/Enforcement),
@@ -213,214 +325,232 @@ class IncidentResponseAgent(Agent):
                 offender_jid (str): The JID of the attacker/offender.
                 victim_jid (str, optional): The JID of the victim.
                 intensity (int, optional): The attacker's intensity (1-10).
+                started_at (datetime.datetime, optional): Accept timestamp to record; read from the clock if omitted.
 
             Returns:
                 bool: True if mitigation was completed successfully, False otherwise.
             """
             if hasattr(self.agent, "mitigation_history"):
-                self.agent.mitigation_history.append(datetime.datetime.now())
+                self.agent.mitigation_history.append(started_at or datetime.datetime.now())
 
             victim_str = str(victim_jid) if victim_jid else "unknown"
 
             # PHASE 1: Investigation & Analysis (intensity-based)
             # Higher intensity = more sophisticated attack = longer investigation
             investigation_time = 2.0 + (intensity * 0.8) if intensity else 4.0
-            _log("IncidentResponse", str(self.agent.jid),
-                 f"[INVESTIGATING] {threat_type} (intensity={intensity}) - estimated {investigation_time:.1f}s")
-            await asyncio.sleep(investigation_time)
+            _log("IncidentResponse", self.agent._jid_str,
+                 "[INVESTIGATING] %s (intensity=%s) - estimated %.1fs", threat_type, intensity, investigation_time)
+            await self._phase(investigation_time)
 
-            _log("IncidentResponse", str(self.agent.jid),
-                 f"Executing mitigation for {threat_type} from {offender_jid} on victim {victim_str}")
+            _log("IncidentResponse", self.agent._jid_str,
+                 "Executing mitigation for %s from %s on victim %s", threat_type, offender_jid, victim_str)
             if "attacker" not in offender_jid:
-                _log("IncidentResponse", str(self.agent.jid),
-                     f"SAFEGUARD: Ignored mitigation request for internal node {offender_jid}. Not an attacker.")
+                _log("IncidentResponse", self.agent._jid_str,
+                     "SAFEGUARD: Ignored mitigation request for internal node %s. Not an attacker.", offender_jid)
                 return False
 
-            nodes_to_protect = self.agent.get("nodes_to_protect") or []
-
-            if threat_type == "malware" or threat_type == "resource_anomaly":
-                _log("IncidentResponse", str(self.agent.jid), f"MITIGATION: Malware containment - blocking {offender_jid}")
-
-                # PHASE 2: Containment (intensity-based)
-                # Higher intensity = more evasive = takes longer to contain
-                containment_time = 1.0 + (intensity * 0.6) if intensity else 2.0
-                await asyncio.sleep(containment_time)
-
-                for node_jid in nodes_to_protect:
-                    ctrl = Message(to=node_jid)
-                    ctrl.set_metadata("protocol", "firewall-control")
-                    ctrl.body = f"BLOCK_JID:{offender_jid}"
-                    await self.send(ctrl)
-
-                _log("IncidentResponse", str(self.agent.jid), f"MITIGATION: {offender_jid} blocked on all nodes.")
-
-                if victim_str != "unknown" and "attacker" not in victim_str:
-                    # PHASE 3: Eradication (intensity-based)
-                    eradication_time = 1.0 + (intensity * 0.4) if intensity else 1.5
-                    await asyncio.sleep(eradication_time)
-                    cure = Message(to=victim_str)
-                    cure.set_metadata("protocol", "malware-cure")
-                    cure.body = "CURE_INFECTION"
-                    await self.send(cure)
-
-                for node_jid in nodes_to_protect:
-                    advisory = Message(to=node_jid)
-                    advisory.set_metadata("protocol", "firewall-control")
-                    advisory.body = f"QUARANTINE_ADVISORY:incident_{incident_id}"
-                    await self.send(advisory)
-                return True
-
-            elif threat_type == "ddos":
-                _log("IncidentResponse", str(self.agent.jid), f"MITIGATION: DDoS defense - rate limiting {offender_jid}")
-
-                # PHASE 2: Mitigation (intensity-based)
-                # Higher intensity = larger botnet = harder to rate limit
-                mitigation_time = 3.0 + (intensity * 0.8) if intensity else 4.0
-                await asyncio.sleep(mitigation_time)
-
-                for node_jid in nodes_to_protect:
-                    ctrl = Message(to=node_jid)
-                    ctrl.set_metadata("protocol", "firewall-control")
-                    ctrl.body = f"RATE_LIMIT:{offender_jid}:10msg/s"
-                    await self.send(ctrl)
-
-                _log("IncidentResponse", str(self.agent.jid), f"MITIGATION: Applied rate limiting to {offender_jid}")
-
-                # PHASE 3: Temporary blocking
-                blocking_time = 1.0 + (intensity * 0.3) if intensity else 1.5
-                await asyncio.sleep(blocking_time)
-                for node_jid in nodes_to_protect:
-                    ctrl = Message(to=node_jid)
-                    ctrl.set_metadata("protocol", "firewall-control")
-                    ctrl.body = f"TEMP_BLOCK:{offender_jid}:15s"
-                    await self.send(ctrl)
-                return True
-
-            elif "insider_threat" in threat_type:
-                mitigation_success_rate = max(40, 95 - (intensity * 5))  # 90% at intensity=1
-
-                mitigate = False
-                if victim_str == "unknown":
-                     _log("IncidentResponse", str(self.agent.jid), "MITIGAÇÃO (Insider): No target identified yet.")
-                     return False
-
-                # PHASE 2: Analysis (intensity-based)
-                # Higher intensity = more sophisticated insider = longer to gather evidence
-                analysis_time = 2.0 + (intensity * 0.7) if intensity else 4.0
-                await asyncio.sleep(analysis_time)
-
-                if "login" in threat_type or "unauthorized" in threat_type:
-                    if intensity < 7:
+            nodes_to_protect = self.agent._nodes_tuple
+
+            handler = self._mitigators.get(threat_type)
+            if handler is None:
+                # Insider sub-types (insider_threat_login, ..._exfiltration, ...) resolve once, then hit the table
+                handler = self._mitigate_insider if threat_type and "insider_threat" in threat_type else self._mitigate_default
+                self._mitigators[threat_type] = handler
+            return await handler(incident_id, threat_type, offender_jid, victim_str, intensity, nodes_to_protect)
+
+        async def _mitigate_malware(self, incident_id: str, threat_type: str, offender_jid: str, victim_str: str, intensity: int, nodes_to_protect: Tuple[str, ...]) -> bool:
+            """Malware containment: block offender everywhere, then cure the victim."""
+            _log("IncidentResponse", self.agent._jid_str, "MITIGATION: Malware containment - blocking %s", offender_jid)
+
+            # PHASE 2: Containment (intensity-based)
+            # Higher intensity = more evasive = takes longer to contain
+            containment_time = 1.0 + (intensity * 0.6) if intensity else 2.0
+            await self._phase(containment_time)
+
+            # Block + quarantine advisory travel as one compound control message per node
+            flush = None
+            for node_jid in nodes_to_protect:
+                flush = self._queue_fw(node_jid, f"BLOCK_JID:{offender_jid};QUARANTINE_ADVISORY:incident_{incident_id}")
+            await self._await_fw(flush)
+
+            _log("IncidentResponse", self.agent._jid_str, "MITIGATION: %s blocked on %d nodes.", offender_jid, len(nodes_to_protect))
+
+            if victim_str != "unknown" and "attacker" not in victim_str:
+                # PHASE 3: Eradication (intensity-based)
+                eradication_time = 1.0 + (intensity * 0.4) if intensity else 1.5
+                await self._phase(eradication_time)
+                cure = Message(to=victim_str)
+                cure.set_metadata("protocol", "malware-cure")
+                cure.body = "CURE_INFECTION"
+                await self.send(cure)
+            return True
+
+        async def _mitigate_ddos(self, incident_id: str, threat_type: str, offender_jid: str, victim_str: str, intensity: int, nodes_to_protect: Tuple[str, ...]) -> bool:
+            """DDoS defense: rate limit the offender, then apply a temporary block."""
+            _log("IncidentResponse", self.agent._jid_str, "MITIGATION: DDoS defense - rate limiting %s", offender_jid)
+
+            # PHASE 2: Mitigation (intensity-based)
+            # Higher intensity = larger botnet = harder to rate limit
+            mitigation_time = 3.0 + (intensity * 0.8) if intensity else 4.0
+            await self._phase(mitigation_time)
+
+            flush = None
+            for node_jid in nodes_to_protect:
+                flush = self._queue_fw(node_jid, f"RATE_LIMIT:{offender_jid}:10msg/s")
+            await self._await_fw(flush)
+
+            _log("IncidentResponse", self.agent._jid_str, "MITIGATION: Applied rate limiting to %s", offender_jid)
+
+            # PHASE 3: Temporary blocking
+            blocking_time = 1.0 + (intensity * 0.3) if intensity else 1.5
+            await self._phase(blocking_time)
+            for node_jid in nodes_to_protect:
+                flush = self._queue_fw(node_jid, f"TEMP_BLOCK:{offender_jid}:15s")
+            await self._await_fw(flush)
+            return True
+
+        async def _mitigate_insider(self, incident_id: str, threat_type: str, offender_jid: str, victim_str: str, intensity: int, nodes_to_protect: Tuple[str, ...]) -> bool:
+            """Insider threat: suspend or ban the offender depending on the escalation phase."""
+            mitigation_success_rate = max(40, 95 - (intensity * 5))  # 90% at intensity=1
+
+            mitigate = False
+            if victim_str == "unknown":
+                 _log("IncidentResponse", self.agent._jid_str, "MITIGAÇÃO (Insider): No target identified yet.")
+                 return False
+
+            # PHASE 2: Analysis (intensity-based)
+            # Higher intensity = more sophisticated insider = longer to gather evidence
+            analysis_time = 2.0 + (intensity * 0.7) if intensity else 4.0
+            await self._phase(analysis_time)
+
+            if "login" in threat_type or "unauthorized" in threat_type:
+                if intensity < 7:
+                    mitigate = True
+                else:
+                    mitigate = False
+            else:
+                if "exfiltration" in threat_type:
+                    if intensity < 9:
                         mitigate = True
                     else:
                         mitigate = False
-                else:
-                    if "exfiltration" in threat_type:
-                        if intensity < 9:
-                            mitigate = True
-                        else:
+                if "backdoor" in threat_type or "lateral" in threat_type:
+                    if intensity == 9:
+                        mitigate = True
+                    else:
+                        bit = random.randint(0, 1)
+                        if bit == 0:
                             mitigate = False
-                    if "backdoor" in threat_type or "lateral" in threat_type:
-                        if intensity == 9:
-                            mitigate = True
                         else:
-                            bit = random.randint(0, 1)
-                            if bit == 0:
-                                mitigate = False
-                            else:
-                                mitigate = True
-
-                if not mitigate:
-                    _log("IncidentResponse", str(self.agent.jid),
-                         f"[MITIGATION EVADED] Attacker used techniques to bypass initial suspension ({mitigation_success_rate}% success rate)")
-                    # Still send forensic clean, but suspension failed
+                            mitigate = True
+
+            if not mitigate:
+                _log("IncidentResponse", self.agent._jid_str,
+                     "[MITIGATION EVADED] Attacker used techniques to bypass initial suspension (%d%% success rate)",
+                     mitigation_success_rate)
+                # Still send forensic clean, but suspension failed
+                forensic_msg = Message(to=victim_str)
+                forensic_msg.set_metadata("protocol", "incident-response")
+                forensic_msg.body = "FORENSIC_CLEAN:insider_threat"
+                await self.send(forensic_msg)
+                return False  # Mitigation partially failed
+
+            else:
+                if "login" in threat_type or "unauthorized" in threat_type:
+                    # 1ª OFENSA -> Suspensão Local
+                    _log("IncidentResponse", self.agent._jid_str,
+                         "MITIGATION [1]: Insider threat - suspending %s access on victim %s", offender_jid, victim_str)
+
+                    # PHASE 3: Enforcement (intensity-based)
+                    enforcement_time = 1.0 + (intensity * 0.4) if intensity else 1.5
+                    await self._phase(enforcement_time)
+
+                    # Suspend attacker account
+                    await self._await_fw(self._queue_fw(victim_str, f"SUSPEND_ACCESS:{offender_jid}"))
+
+                    # Notify attacker that they've been blocked (stops attack progression)
+                    block_notice = Message(to=offender_jid)
+                    block_notice.body = f"ACCOUNT_SUSPENDED: Your account has been suspended due to suspicious activity"
+                    await self.send(block_notice)
+
+                    # Send forensic clean to victim node
                     forensic_msg = Message(to=victim_str)
                     forensic_msg.set_metadata("protocol", "incident-response")
                     forensic_msg.body = "FORENSIC_CLEAN:insider_threat"
                     await self.send(forensic_msg)
-                    return False  # Mitigation partially failed
+
+                    _log("IncidentResponse", self.agent._jid_str, "Admin alert logged + Forensic clean sent.")
+                    return True
 
                 else:
-                    if "login" in threat_type or "unauthorized" in threat_type:
-                        # 1ª OFENSA -> Suspensão Local
-                        _log("IncidentResponse", str(self.agent.jid),
-                             f"MITIGATION [1]: Insider threat - suspending {offender_jid} access on victim {victim_str}")
-
-                        # PHASE 3: Enforcement (intensity-based)
-                        enforcement_time = 1.0 + (intensity * 0.4) if intensity else 1.5
-                        await asyncio.sleep(enforcement_time)
-
-                        # Suspend attacker account
-                        ctrl = Message(to=victim_str)
-                        ctrl.set_metadata("protocol", "firewall-control")
-                        ctrl.body = f"SUSPEND_ACCESS:{offender_jid}"
-                        await self.send(ctrl)
-
-                        # Notify attacker that they've been blocked (stops attack progression)
-                        block_notice = Message(to=offender_jid)
-                        block_notice.body = f"ACCOUNT_SUSPENDED: Your account has been suspended due to suspicious activity"
-                        await self.send(block_notice)
-
-                        # Send forensic clean to victim node
-                        forensic_msg = Message(to=victim_str)
+                    if "exfiltration" in threat_type:
+                        _log("IncidentResponse", self.agent._jid_str,
+                             "MITIGATION [2]: Applying permanent ban.")
+
+                        # Notify attacker of permanent ban
+                        ban_notice = Message(to=offender_jid)
+                        ban_notice.body = f"ACCOUNT_BANNED: Permanent ban due to repeated security violations"
+                        await self.send(ban_notice)
+
+                    if "backdoor" in threat_type or "lateral" in threat_type:
+                        _log("IncidentResponse", self.agent._jid_str,
+                             "MITIGATION [3]:Applying permanent ban.")
+
+                        ban_notice = Message(to=offender_jid)
+                        ban_notice.body = f"ACCOUNT_BANNED: Permanent ban enforced due to repeated severe violations"
+                        await self.send(ban_notice)
+
+                    # Global block and forensic clean on all nodes
+                    forensic_msgs = []
+                    flush = None
+                    for node_jid in nodes_to_protect:
+                        # Block attacker globally
+                        flush = self._queue_fw(node_jid, f"BLOCK_JID:{offender_jid}")
+
+                        # Forensic clean to remove any backdoors
+                        forensic_msg = Message(to=node_jid)
                         forensic_msg.set_metadata("protocol", "incident-response")
                         forensic_msg.body = "FORENSIC_CLEAN:insider_threat"
-                        await self.send(forensic_msg)
+                        forensic_msgs.append(forensic_msg)
+                    # The global block must be out before the clean-up messages
+                    await self._await_fw(flush)
+                    # Identical payload to every node: fan out concurrently instead of one send at a time
+                    await asyncio.gather(*(self.send(m) for m in forensic_msgs))
 
-                        _log("IncidentResponse", str(self.agent.jid), "Admin alert logged + Forensic clean sent.")
-                        return True
+                    return True
 
-                    else:
-                        if "exfiltration" in threat_type:
-                            _log("IncidentResponse", str(self.agent.jid),
-                                 f"MITIGATION [2]: Applying permanent ban.")
-
-                            # Notify attacker of permanent ban
-                            ban_notice = Message(to=offender_jid)
-                            ban_notice.body = f"ACCOUNT_BANNED: Permanent ban due to repeated security violations"
-                            await self.send(ban_notice)
-
-                        if "backdoor" in threat_type or "lateral" in threat_type:
-                            _log("IncidentResponse", str(self.agent.jid),
-                                 f"MITIGATION [3]:Applying permanent ban.")
-
-                            ban_notice = Message(to=offender_jid)
-                            ban_notice.body = f"ACCOUNT_BANNED: Permanent ban enforced due to repeated severe violations"
-                            await self.send(ban_notice)
-
-                        # Global block and forensic clean on all nodes
-                        for node_jid in nodes_to_protect:
-                            # Block attacker globally
-                            ctrl = Message(to=node_jid)
-                            ctrl.set_metadata("protocol", "firewall-control")
-                            ctrl.body = f"BLOCK_JID:{offender_jid}"
-                            await self.send(ctrl)
-
-                            # Send forensic clean to remove any backdoors
-                            forensic_msg = Message(to=node_jid)
-                            forensic_msg.set_metadata("protocol", "incident-response")
-                            forensic_msg.body = "FORENSIC_CLEAN:insider_threat"
-                            await self.send(forensic_msg)
-
-                        return True
-
-            else:
-                return False
+        async def _mitigate_default(self, incident_id: str, threat_type: str, offender_jid: str, victim_str: str, intensity: int, nodes_to_protect: Tuple[str, ...]) -> bool:
+            """Fallback for unknown threat types: nothing to mitigate."""
+            return False
 
         async def run(self):
             """Main loop for the CNP Participant Behaviour.
 
             Listens for incoming CNP messages (CFP or ACCEPT_PROPOSAL) and delegates
-            handling to the appropriate method. Timeout is 1 second per cycle.
+            handling to the appropriate method. Blocks on the behaviour's mailbox
+            queue until a message arrives instead of waking up every second.
             """
-            msg = await self.receive(timeout=1)
+            # SPADE's receive() treats timeout=None as non-blocking, so await the
+            # behaviour's own asyncio.Queue directly to sleep until dispatch.
+            msg = await self.queue.get()
             if msg:
                 protocol = msg.get_metadata("protocol")
                 performative = msg.get_metadata("performative")
+                # Handlers run as tasks so a slow send never holds up the next mailbox read
                 if protocol == "cnp-cfp" and performative == "CFP":
-                    await self.handle_cfp(msg)
+                    self._spawn(self.handle_cfp(msg))
                 elif protocol == "cnp-accept" and performative == "ACCEPT_PROPOSAL":
-                    await self.handle_accept_proposal(msg)
+                    self._spawn(self.handle_accept_proposal(msg))
+
+    def _refresh_availability(self) -> None:
+        """Recomputes the cached mitigating count and availability score.
+
+        Called whenever an input changes (resource tick, incident start/finish) so the
+        CFP path only has to read `_mitigating_count` and `_cached_score`.
+        """
+        incidents = self.get("active_incidents") or {}
+        self._mitigating_count = sum(1 for inc in incidents.values() if inc["status"] == IncidentStatus.MITIGATING)
+        self._cached_score = float(self.get("cpu_usage") or 20.0) + self._mitigating_count * 10.0
 
     async def setup(self):
         """Sets up the IncidentResponseAgent, initializes state, and adds behaviors.
@@ -428,13 +558,18 @@ class IncidentResponseAgent(Agent):
         Initializes state variables for resource tracking, active incidents, and mitigation history.
         Adds CleanupBehaviour, ResourceBehaviour, and CNPParticipantBehaviour.
         """
-        _log("IncidentResponse", str(self.jid), "starting...")
+        self._jid_str = str(self.jid)  # Cached once; used by every _log call
+        _ensure_console_logging()
+        _log("IncidentResponse", self._jid_str, "starting...")
         self.set("cpu_usage", 10.0)
         self.set("bandwidth_usage", 3.0)
         self.set("active_incidents", {})
-        self.set("suspended_offenders_log", defaultdict(int))
+        self.suspended_offenders_log = defaultdict(int) # Suspensions per offender (plain attribute, not KV)
         self.set("refused_cfps", 0) # Counter for refused CFPs due to overload
-        self.mitigation_history = [] # Tracks mitigation start times
+        self.mitigation_history = deque(maxlen=1000) # Tracks mitigation start times (most recent 1000)
+        # nodes_to_protect is set once before start and never mutated; freeze it for the broadcast loops
+        self._nodes_tuple = tuple(self.get("nodes_to_protect") or ())
+        self._refresh_availability()
 
         self.add_behaviour(self.CleanupBehaviour(period=3.0))
         self.add_behaviour(self.ResourceBehaviour(period=2.0))
@@ -446,18 +581,25 @@ async def main():
     parser.add_argument("--jid", required=True, help="Response agent JID")
     parser.add_argument("--password", required=False, help="Agent password")
     parser.add_argument("--nodes", default="", help="Comma-separated node JIDs")
+    parser.add_argument("--mitigation-time-scale", type=float, default=IncidentResponseAgent.MITIGATION_TIME_SCALE,
+                        help="Multiplier for simulated mitigation phase durations (0 disables them)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Console log level for this agent")
     args = parser.parse_args()
+    logger.setLevel(args.log_level)
+    _ensure_console_logging()
 
     passwd = args.password or getpass.getpass()
     nodes = [p.strip() for p in args.nodes.split(',') if p.strip()]
 
     agent = IncidentResponseAgent(args.jid, passwd)
     agent.set("nodes_to_protect", nodes)
+    agent.MITIGATION_TIME_SCALE = args.mitigation_time_scale
 
     try:
         await agent.start(auto_register=True)
     except Exception as e:
-        _log("IncidentResponse", args.jid, f"Failed to start: {e}")
+        _log("IncidentResponse", args.jid, "Failed to start: %s", e)
         return
 
     _log("IncidentResponse", args.jid, "running. Press Ctrl+C to stop")
@@ -10,30 +10,161 @@ include the intended destination under metadata key 'dst' (exact destination JID
 
 import argparse
 import asyncio
-import datetime
+import atexit
 import getpass
-from typing import Dict, Set, List, Optional
+import sys
+import time
+from typing import Dict, FrozenSet, Set, List, Optional, Tuple
 from collections import deque
-import json
+from functools import lru_cache
 from spade.behaviour import CyclicBehaviour, PeriodicBehaviour
 
 import spade
 from spade.agent import Agent
 from spade.message import Message
+from spade.template import Template
 
 from firewall import RouterFirewallBehaviour
 
 
+# Metadata keys preserved on monitor copies (attack details the monitors score on)
+_COPY_KEYS = ("attacker_intensity", "task", "spread_intensity")
+# Per-hop routing keys the router rewrites itself instead of copying through
+_HOP_KEYS = frozenset(("dst", "via", "ttl", "original_sender"))
+# Fixed part of every monitor copy's metadata; copied per packet, never mutated
+_COPY_META = {"protocol": "network-copy"}
+_DEFAULT_TTL = 64
+# str() of every TTL value a default-TTL packet can carry, indexed by the int value
+_TTL_STRS = tuple(str(i) for i in range(_DEFAULT_TTL + 1))
+# JIDs are interned where they enter the router so table lookups hit on identity
+_intern = sys.intern
+
+
+# Set to False to silence router logging (e.g. for throughput runs)
+LOG_ENABLED = True
+
+# [epoch second, "HH:MM:SS"] of the last formatted timestamp
+_last_ts = [0, ""]
+
+# Pending log lines, written out in batches by _flush_logs (oldest dropped on overflow)
+_LOG_QUEUE: deque = deque(maxlen=8192)
+# Router lines lag direct print()s from other agents by up to this much; 0 writes inline
+LOG_FLUSH_INTERVAL = 0.05
+# The running flusher task, shared by every router in the process
+_log_flusher: List[Optional[asyncio.Task]] = [None]
+
+
 def _log(agent_type: str, jid: str, msg: str) -> None:
     """Log formatted message with timestamp.
 
+    The "HH:MM:SS" string is only re-formatted when the wall-clock second changes.
+    Once a router has started, lines are queued and written by `_flush_logs`
+    instead of printed inline.
+
     Args:
         agent_type (str): Type of agent (e.g., "Router").
         jid (str): Agent JID identifier.
         msg (str): Message to log.
     """
-    ts = datetime.datetime.now().strftime("%H:%M:%S")
-    print(f"[{ts}] [{agent_type} {jid}] {msg}")
+    if not LOG_ENABLED:
+        return
+    sec = int(time.time())
+    if sec != _last_ts[0]:
+        _last_ts[0] = sec
+        _last_ts[1] = time.strftime("%H:%M:%S", time.localtime(sec))
+    line = f"[{_last_ts[1]}] [{agent_type} {jid}] {msg}\n"
+    if _log_flusher[0] is None:
+        sys.stdout.write(line)
+    else:
+        _LOG_QUEUE.append(line)
+
+
+def _drain_logs() -> None:
+    """Write every queued log line with a single stdout write."""
+    if not _LOG_QUEUE:
+        return
+    lines = list(_LOG_QUEUE)
+    _LOG_QUEUE.clear()
+    sys.stdout.write("".join(lines))
+    sys.stdout.flush()
+
+
+async def _flush_logs() -> None:
+    """Drain the log queue every LOG_FLUSH_INTERVAL seconds."""
+    try:
+        while True:
+            await asyncio.sleep(LOG_FLUSH_INTERVAL)
+            _drain_logs()
+    finally:
+        _drain_logs()
+
+
+def _start_log_flusher() -> None:
+    """Start the shared log flusher on the running loop if it is not running yet.
+
+    Does nothing when LOG_FLUSH_INTERVAL is 0, so `_log` keeps writing inline.
+    """
+    if not LOG_FLUSH_INTERVAL:
+        return
+    task = _log_flusher[0]
+    if task is None or task.done():
+        _log_flusher[0] = asyncio.get_running_loop().create_task(_flush_logs())
+
+
+atexit.register(_drain_logs)
+
+
+@lru_cache(maxsize=1024)
+def _local(jid: str) -> str:
+    """Return the local part of a JID ("router3_node0@localhost" -> "router3_node0")."""
+    return jid.split("@", 1)[0]
+
+
+def _build_fwd(to: str, body: str, metadata: Dict[str, str]) -> Message:
+    """Build an outgoing message in one constructor call.
+
+    Args:
+        to (str): Destination JID.
+        body (str): Message body.
+        metadata (Dict[str, str]): Complete metadata (string values), used as-is.
+
+    Returns:
+        Message: The message ready to send.
+    """
+    return Message(to=to, body=body, metadata=metadata)
+
+
+class _PrefixTrie:
+    """Character trie mapping route prefixes to next hops (longest-prefix lookup).
+
+    Wildcard routes such as ``router3_*`` are stored under their prefix
+    (``router3_``) so a destination is resolved in O(len(dst)) instead of
+    scanning every routing-table entry.
+    """
+
+    _END = None  # key holding the next hop at a terminal node
+
+    def __init__(self):
+        self._root: Dict = {}
+
+    def insert(self, prefix: str, value: str) -> None:
+        """Store `value` for `prefix`, replacing any previous value."""
+        node = self._root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node[self._END] = value
+
+    def longest_prefix(self, key: str) -> Optional[str]:
+        """Return the value of the longest stored prefix of `key`, or None."""
+        node = self._root
+        best = node.get(self._END)
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                break
+            if self._END in node:
+                best = node[self._END]
+        return best
 
 
 class RouterAgent(Agent):
@@ -48,16 +179,71 @@ class RouterAgent(Agent):
         router_neighbors (Dict[str, Dict]): Mapping router JID -> {cpu_usage, bandwidth_usage}.
         cpu_usage (float): Current CPU usage percentage.
         bandwidth_usage (float): Current bandwidth usage percentage.
-        messages_routed (int): Counter for messages processed.
+        _messages_routed (int): Counter for messages processed in the current resource period.
         firewall (RouterFirewallBehaviour): The attached firewall behaviour instance.
+        _exact_routes (Dict[str, str]): Exact-match subset of the routing table.
+        _prefix_trie (_PrefixTrie): Wildcard routes indexed by prefix for longest-prefix lookup.
+        _resolve (Callable[[str], Tuple[bool, Optional[str]]]): LRU-cached `_resolve_uncached`.
+        _local_nodes (FrozenSet[str]): Attribute snapshot of local_nodes for hot-path membership tests.
+        _fanout (Tuple[Tuple[str, ...], Tuple[str, ...]]): Monitor copy targets indexed by is_internal.
     """
 
+    ROUTE_CACHE_SIZE = 4096
+    # Simulation pacing (seconds); 0 disables the corresponding wait
+    SIM_DELAY_IN = 0.1  # Simulated reception/processing delay per packet
+    MONITOR_SETTLE_TIMEOUT = 0.02  # Max wait for monitor-driven rule updates per packet
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._jid_str = str(self.jid)  # Cached once; used for logging, BFS and "via" metadata
+        # Built here (not in setup) because routes are added before the agent starts
+        self._prefix_trie = _PrefixTrie()
+        self._resolve = lru_cache(maxsize=self.ROUTE_CACHE_SIZE)(self._resolve_uncached)
+        self._local_nodes: FrozenSet[str] = frozenset()
+        self._fanout: Tuple[Tuple[str, ...], Tuple[str, ...]] = ((), ())
+        self._has_monitors = False
+        self._routing_table: Dict[str, str] = {}  # Full table as configured (exact + wildcard)
+        self._exact_routes: Dict[str, str] = {}  # Literal destinations only; wildcards live in the trie
+        self._fw: Optional[RouterFirewallBehaviour] = None
+        self._messages_routed = 0  # Plain counter; read and reset by ResourceBehaviour
+        self._topology_version = 0  # Bumped whenever routes, local nodes or costs change
+        self._bfs_version = -1  # Topology version _bfs_routes was computed for
+        self._bfs_routes: Dict[str, Tuple[float, List[str]]] = {}
+        self._adjacency: Dict[str, Tuple[str, ...]] = {}  # Router JID -> neighbor router JIDs
+        self._router_id: Dict[str, int] = {}  # Router JID -> index into the BFS visited bitmap
+
+    def _resolve_uncached(self, dst: str) -> Tuple[bool, Optional[str]]:
+        """Decide how to reach `dst`.
+
+        Resolution order is local delivery, then BFS, then the static routing
+        table (exact match, then wildcard prefix). Callers go through
+        `_resolve`, the LRU-cached wrapper that `_bump_topology` clears.
+
+        Args:
+            dst (str): Final destination JID.
+
+        Returns:
+            Tuple[bool, Optional[str]]: (True, dst) for local delivery,
+            (False, next_hop) for forwarding, or (False, None) if no route exists.
+        """
+        if dst in self._local_nodes:
+            return True, dst
+
+        # Intelligent routing (BFS), falling back to simple static routing
+        next_hop = self.find_best_path_bfs(dst)
+        if not next_hop:
+            # Exact match, then wildcard prefix (e.g., routerX_* -> routerX_nodeY@domain)
+            next_hop = self._exact_routes.get(dst) or self._prefix_trie.longest_prefix(dst)
+        return False, next_hop or None
+
     def find_best_path_bfs(self, destination: str) -> Optional[str]:
         """Find the best path using Breadth-First Search (BFS) considering router resources.
 
         This method attempts to find a route with the lowest calculated cost, where cost
         is a combination of hop count and the current resource utilization of the next
-        hop router in the path. 
+        hop router in the path. The underlying sweep (`_sweep_routes`) covers all
+        destination routers at once and is reused until `_topology_version` changes.
+
         Args:
             destination (str): Target node JID (e.g., "router3_node0@localhost").
 
@@ -68,63 +254,124 @@ class RouterAgent(Agent):
             Cost formula: $Cost = (\text{hop\_count} \times 1.0) + (\text{resource\_usage} \times 0.5)$
             where $\text{resource\_usage} = (\text{CPU} + \text{Bandwidth}) / 200$ (normalized 0-1).
         """
-        router_neighbors = self.get("router_neighbors") or {}
-
         # Extract destination router prefix (e.g., "router3" from "router3_node0@localhost")
-        dest_parts = destination.split("@")[0].split("_")
+        dest_parts = _local(destination).split("_")
         if len(dest_parts) >= 2:
             dest_router_prefix = dest_parts[0]  # e.g., "router3"
         else:
             # Can't determine destination router, fall back to simple routing
             return None
 
-        # BFS to find all paths to destination router
-        queue = deque([(str(self.jid), [str(self.jid)], 0.0)])  # (current_router, path, cost)
-        visited = {str(self.jid)}
-        best_path = None
-        best_cost = float('inf')
+        # One sweep serves every destination until the topology/costs change
+        if self._bfs_version != self._topology_version:
+            self._bfs_routes = self._sweep_routes()
+            self._bfs_version = self._topology_version
 
-        while queue:
-            current, path, cost = queue.popleft()
+        entry = self._bfs_routes.get(dest_router_prefix)
+        if entry is None:
+            return None
+        best_cost, best_path = entry
+        first_hop = best_path[1]
+        # Log the BFS routing decision
+        path_str = " -> ".join([_local(p) for p in best_path])
+        _log("Router", self._jid_str, f"[BFS] Route to {_local(destination)}: {path_str} (cost: {best_cost:.2f})")
+        return first_hop
 
-            # Extract current router prefix
-            current_prefix = current.split("@")[0]
-
-            # Check if we reached destination router
-            if current_prefix == dest_router_prefix or (len(path) > 1 and path[-1].split("@")[0] == dest_router_prefix):
-                if cost < best_cost:
-                    best_cost = cost
-                    best_path = path
-                continue
-
-            # Check all neighbors of current router
-            if current == str(self.jid):
-                # For the starting router, use router_neighbors
-                for next_hop_jid in router_neighbors.keys():
-                    if next_hop_jid in visited:
-                        continue
+    def _sweep_routes(self) -> Dict[str, Tuple[float, List[str]]]:
+        """Run one BFS from this router and record the cheapest path to every router reached.
 
-                    # Calculate resource cost for next_hop
-                    cpu = router_neighbors[next_hop_jid].get("cpu_usage", 15.0)
-                    bw = router_neighbors[next_hop_jid].get("bandwidth_usage", 8.0)
-                    resource_cost = (cpu + bw) / 200.0  # Normalize to 0-1
+        Returns:
+            Dict[str, Tuple[float, List[str]]]: Router prefix (e.g. "router3") -> (cost, path),
+            where path starts at this router.
+        """
+        router_neighbors = self.get("router_neighbors") or {}
+        me = self._jid_str
+        adjacency = self._adjacency
+
+        # Give every router we know of an id before sizing the bitmap
+        ids = self._router_id
+        for router in (me, *adjacency):
+            if router not in ids:
+                ids[router] = len(ids)
+            for nb in adjacency.get(router, ()):
+                if nb not in ids:
+                    ids[nb] = len(ids)
+
+        queue = deque([(me, [me], 0.0)])  # (current_router, path, cost)
+        visited = bytearray(len(ids))
+        visited[ids[me]] = 1
+        best: Dict[str, Tuple[float, List[str]]] = {}
 
-                    # Total cost = hop count + resource weight
-                    hop_cost = 1.0
-                    total_cost = cost + hop_cost + (resource_cost * 0.5)
+        while queue:
+            current, path, cost = queue.popleft()
 
-                    new_path = path + [next_hop_jid]
-                    visited.add(next_hop_jid)
-                    queue.append((next_hop_jid, new_path, total_cost))
+            if len(path) > 1:
+                current_prefix = _local(current)
+                known = best.get(current_prefix)
+                if known is None or cost < known[0]:
+                    best[current_prefix] = (cost, path)
+
+            # Check all neighbors of current router (learned via adjacency-sync)
+            for next_hop_jid in adjacency.get(current, ()):
+                next_id = ids[next_hop_jid]
+                if visited[next_id]:
+                    continue
+
+                # Calculate resource cost for next_hop (metrics are known for direct neighbors only)
+                metrics = router_neighbors.get(next_hop_jid) or {}
+                cpu = metrics.get("cpu_usage", 15.0)
+                bw = metrics.get("bandwidth_usage", 8.0)
+                resource_cost = (cpu + bw) / 200.0  # Normalize to 0-1
+
+                # Total cost = hop count + resource weight
+                hop_cost = 1.0
+                total_cost = cost + hop_cost + (resource_cost * 0.5)
+
+                new_path = path + [next_hop_jid]
+                visited[next_id] = 1
+                queue.append((next_hop_jid, new_path, total_cost))
+
+        return best
+
+    def _bump_topology(self) -> None:
+        """Mark routes/costs as changed: invalidates the BFS sweep and per-destination cache."""
+        self._topology_version += 1
+        self._resolve.cache_clear()
+
+    class AdjacencyBehaviour(PeriodicBehaviour):
+        """Periodically share this router's view of the router graph with its neighbors.
+
+        Each sync message carries one ``router=nb1,nb2`` line per known router.
+        Received maps are merged into `_adjacency`, so after a few periods every
+        router knows the full graph and BFS can search beyond its direct neighbors.
+        """
 
-        # Return first hop if path found
-        if best_path and len(best_path) > 1:
-            first_hop = best_path[1]
-            # Log the BFS routing decision
-            path_str = " -> ".join([p.split("@")[0] for p in best_path])
-            _log("Router", str(self.jid), f"[BFS] Route to {destination.split('@')[0]}: {path_str} (cost: {best_cost:.2f})")
-            return first_hop
-        return None
+        async def run(self):
+            """Merge adjacency received since the last period, then broadcast ours."""
+            agent = self.agent
+            changed = False
+            while True:
+                msg = await self.receive(timeout=0)
+                if not msg:
+                    break
+                for line in (msg.body or "").splitlines():
+                    router, _, neighbors = line.partition("=")
+                    if not router or router == agent._jid_str:
+                        continue
+                    router = _intern(router)
+                    nbs = tuple(_intern(n) for n in neighbors.split(",") if n)
+                    if agent._adjacency.get(router) != nbs:
+                        agent._adjacency[router] = nbs
+                        changed = True
+            if changed:
+                agent._bump_topology()
+
+            body = "\n".join(f"{router}={','.join(nbs)}" for router, nbs in agent._adjacency.items())
+            for neighbor in agent._adjacency.get(agent._jid_str, ()):
+                sync = Message(to=neighbor)
+                sync.set_metadata("protocol", "adjacency-sync")
+                sync.body = body
+                await self.send(sync)
 
     class ResourceBehaviour(PeriodicBehaviour):
         """Periodically update router resource metrics based on routing activity.
@@ -144,10 +391,10 @@ class RouterAgent(Agent):
 
             Side Effects:
                 Updates 'cpu_usage' and 'bandwidth_usage' in agent storage.
-                Resets 'messages_routed' to 0 for the next period measurement.
+                Resets `_messages_routed` to 0 for the next period measurement.
             """
             # Get current message count
-            messages_routed = self.agent.get("messages_routed") or 0
+            messages_routed = self.agent._messages_routed
 
             # Base load for router operation
             base_cpu = 15.0
@@ -167,246 +414,284 @@ class RouterAgent(Agent):
 
             # Log resource usage if there was routing activity
             if messages_routed > 0:
-                _log("Router", str(self.agent.jid),
+                _log("Router", self.agent._jid_str,
                     f"Resource update: cpu={cpu_usage:.1f}% bw={bandwidth_usage:.1f}% msgs_routed={messages_routed}")
 
             # Reset message counter for next period
-            self.agent.set("messages_routed", 0)
+            self.agent._messages_routed = 0
+
+            # Costs may have changed: let the next lookup rebuild the BFS table
+            self.agent._bump_topology()
+
+    class ThreatAlertBehav(CyclicBehaviour):
+        """Forward threat alerts raised by node firewalls to the monitors."""
+
+        async def run(self):
+            """Relay one alert, keeping the metadata the CNP auction needs."""
+            msg = await self.receive(timeout=1)
+            if not msg:
+                return
+            agent = self.agent
+            agent._messages_routed += 1
+            _log("Router", agent._jid_str, f"Threat alert received: {msg.body}")
+
+            for monitor_jid in agent._fanout[0]:
+                fwd = Message(to=monitor_jid)
+                fwd.set_metadata("protocol", "threat-alert")
+                fwd.body = msg.body
+
+                # Forward metadata needed for CNP auction
+                if msg.metadata:
+                    if "offender" in msg.metadata:
+                        fwd.set_metadata("offender", msg.get_metadata("offender"))
+                    if "dst" in msg.metadata:
+                        fwd.set_metadata("dst", msg.get_metadata("dst"))
+                    if "threat_type" in msg.metadata:
+                        fwd.set_metadata("threat_type", msg.get_metadata("threat_type"))
+
+                await self.send(fwd)
+                _log("Router", agent._jid_str, f"Forwarded threat alert to {monitor_jid}")
 
     class RouterBehav(CyclicBehaviour):
         """Main routing behaviour handling message reception and forwarding.
 
         This behaviour listens for incoming messages, applies firewall rules,
-        handles special protocols (node-death, threat-alert), forwards copies
-        to monitors, and routes packets to their destination.
+        handles node-death notifications, forwards copies to monitors, and
+        routes packets to their destination. Threat alerts and adjacency-sync
+        are excluded by its template and handled by their own behaviours.
         """
 
+        BATCH_SIZE = 32  # Max messages drained from the mailbox per run() call
+        WORKERS = 4  # Concurrent routing tasks
+
+        async def on_start(self):
+            """Start the worker tasks that route queued messages concurrently."""
+            self._work_queue: asyncio.Queue = asyncio.Queue()
+            self._workers = [asyncio.create_task(self._worker_loop()) for _ in range(self.WORKERS)]
+
+        async def on_end(self):
+            """Stop the worker tasks."""
+            for task in self._workers:
+                task.cancel()
+
         async def run(self):
-            """Process incoming messages and route to destination.
+            """Hand pending messages to the routing workers.
+
+            Waits up to 1s for the first message, then takes whatever else is
+            already queued (up to `BATCH_SIZE`) without waiting, and enqueues
+            them all for the workers so a slow packet never blocks the mailbox.
+            """
+            msg = await self.receive(timeout=1)
+            if not msg:
+                return
+            queue = self._work_queue
+            queue.put_nowait(msg)
+            for _ in range(self.BATCH_SIZE - 1):
+                msg = await self.receive(timeout=0)
+                if not msg:
+                    break
+                queue.put_nowait(msg)
+
+        async def _worker_loop(self):
+            """Route messages from the work queue until cancelled."""
+            queue = self._work_queue
+            while True:
+                msg = await queue.get()
+                try:
+                    await self._handle(msg)
+                except Exception as e:
+                    _log("Router", self.agent._jid_str, f"Error routing message from {msg.sender}: {e}")
+                finally:
+                    queue.task_done()
+
+        async def _handle(self, msg: Message):
+            """Process one incoming message and route it to its destination.
 
             Flow:
-                1. **Receive**: Wait for a message (timeout=1s).
-                2. **Metrics**: Increment `messages_routed` counter.
-                3. **Special Handling**: Process `node-death` (removes local node) and `threat-alert` (forwards to monitors).
-                4. **Firewall Inbound**: Check message against inbound firewall rules.
-                5. **Destination Check**: Determine `dst` and check `TTL`.
-                6. **Monitoring**: Send a copy of the message (with preserved metadata) to configured monitoring agents.
-                7. **Forwarding Decision**:
+                1. **Metrics**: Increment `messages_routed` counter.
+                2. **Special Handling**: Process `node-death` (removes local node).
+                3. **Firewall Inbound**: Check message against inbound firewall rules.
+                4. **Destination Check**: Determine `dst` and check `TTL`.
+                5. **Monitoring**: Send a copy of the message (with preserved metadata) to configured monitoring agents.
+                6. **Forwarding Decision** (`_resolve`, cached per destination):
                     * **Local**: Deliver directly if `dst` is in `local_nodes`.
                     * **Intelligent Routing**: Use **BFS** (`find_best_path_bfs`) to find the lowest cost next hop.
                     * **Fallback**: Use static `routing_table` if BFS fails.
-                8. **Firewall Outbound**: Check message against outbound firewall rules before sending to the next hop.
+                7. **Firewall Outbound**: Check message against outbound firewall rules before sending to the next hop.
             """
-            msg = await self.receive(timeout=1)
-            if not msg:
-                return
+            agent = self.agent
+            fw = agent._fw
 
             # 1. Increment messages_routed counter for resource tracking
-            self.agent.set("messages_routed", (self.agent.get("messages_routed") or 0) + 1)
+            agent._messages_routed += 1
 
-            _log("Router", str(self.agent.jid), f"received msg from {msg.sender}")
+            sender_jid = _intern(str(msg.sender)) if msg.sender else None
+            _log("Router", agent._jid_str, f"received msg from {sender_jid}")
 
             # Check protocol for special messages
             protocol = msg.get_metadata("protocol")
 
             # 2. Handle node death notifications
             if protocol == "node-death":
-                dead_node = str(msg.sender)
-                _log("Router", str(self.agent.jid), f"Node {dead_node} reported death: {msg.body}")
+                dead_node = sender_jid
+                _log("Router", agent._jid_str, f"Node {dead_node} reported death: {msg.body}")
                 # Remove from local_nodes to stop routing to it
-                local = self.agent.get("local_nodes") or set()
-                if dead_node in local:
-                    local.discard(dead_node)
-                    self.agent.set("local_nodes", local)
-                    _log("Router", str(self.agent.jid), f"Removed {dead_node} from routing table - no longer forwarding")
-                return
-
-            # Check if this is a threat alert from a node firewall
-            if protocol == "threat-alert":
-                _log("Router", str(self.agent.jid), f"Threat alert received: {msg.body}")
-
-                # Forward to monitors
-                monitors = self.agent.get("monitor_jids") or []
-                for monitor_jid in monitors:
-                    fwd = Message(to=monitor_jid)
-                    fwd.set_metadata("protocol", "threat-alert")
-                    fwd.body = msg.body
-
-                    # Forward metadata needed for CNP auction
-                    if msg.metadata:
-                        if "offender" in msg.metadata:
-                            fwd.set_metadata("offender", msg.get_metadata("offender"))
-                        if "dst" in msg.metadata:
-                            fwd.set_metadata("dst", msg.get_metadata("dst"))
-                        if "threat_type" in msg.metadata:
-                            fwd.set_metadata("threat_type", msg.get_metadata("threat_type"))
-
-                    await self.send(fwd)
-                    _log("Router", str(self.agent.jid), f"Forwarded threat alert to {monitor_jid}")
+                if dead_node in agent._local_nodes:
+                    agent._local_nodes = agent._local_nodes - {dead_node}
+                    agent.set("local_nodes", agent._local_nodes)
+                    agent._bump_topology()
+                    _log("Router", agent._jid_str, f"Removed {dead_node} from routing table - no longer forwarding")
                 return
 
             # Small delay to simulate message reception/processing
-            await asyncio.sleep(0.1)
+            if agent.SIM_DELAY_IN:
+                await asyncio.sleep(agent.SIM_DELAY_IN)
 
             # 3. Firewall inbound check
-            fw = self.agent.get("firewall")
             if fw:
                 allowed = await fw.allow_message(msg)
                 if not allowed:
-                    _log("Router", str(self.agent.jid), f"Firewall blocked inbound message from {msg.sender}")
+                    _log("Router", agent._jid_str, f"Firewall blocked inbound message from {sender_jid}")
                     return
-                else:
-                    sender_jid = str(msg.sender)
-                    if "response" not in sender_jid:
-                        _log("Router", str(self.agent.jid), f"Firewall allowed message from {sender_jid}")
+                elif sender_jid and "response" not in sender_jid:
+                    _log("Router", agent._jid_str, f"Firewall allowed message from {sender_jid}")
 
 
             dst = None
-            parsed = None
-            try:
-                parsed = json.loads(str(msg.body)) if msg.body else None
-            except Exception:
-                parsed = None
 
             # Determine destination for normal forwarding
             if msg.metadata and "dst" in msg.metadata:
                 dst = msg.metadata.get("dst")
             else:
                 dst = str(msg.to) if msg.to else None
+            if dst:
+                dst = _intern(dst)
 
             if not dst:
-                _log("Router", str(self.agent.jid), "message missing dst metadata; dropping")
+                _log("Router", agent._jid_str, "message missing dst metadata; dropping")
                 return
 
             # Check TTL (Time-To-Live) to prevent routing loops
-            ttl = int(msg.metadata.get("ttl", 64)) if msg.metadata else 64
+            ttl = int(msg.metadata.get("ttl", _DEFAULT_TTL)) if msg.metadata else _DEFAULT_TTL
             if ttl <= 0:
-                _log("Router", str(self.agent.jid), f"TTL expired for packet to {dst}; dropping")
+                _log("Router", agent._jid_str, f"TTL expired for packet to {dst}; dropping")
                 return
             ttl -= 1  # Decrement TTL for next hop
+            ttl_str = _TTL_STRS[ttl] if ttl <= _DEFAULT_TTL else str(ttl)
 
             # Determine original sender
             original_sender = msg.get_metadata("original_sender") if msg.metadata else None
             if not original_sender:
-                original_sender = str(msg.sender)
-
-            # 4. Send copy to monitoring agents first
-            monitors = self.agent.get("monitor_jids") or []
-            internal_monitors = self.agent.get("internal_monitor_jids") or []
-            local = self.agent.get("local_nodes") or set()
-            sender_jid = str(msg.sender) if msg.sender else None
-            is_internal = False
-            if sender_jid and dst and local:
-                is_internal = (sender_jid in local and dst in local)
-
-            target_monitors = internal_monitors if is_internal and internal_monitors else monitors
-
-            for m in target_monitors:
-                copy_body = msg.body
-                copy_metadata = {
-                    "protocol": "network-copy",
-                    "original_sender": original_sender,
-                    "original_destination": dst
-                }
-
-                # Preserve important attack metadata for monitoring
-                if msg.metadata:
-                    for key in ["attacker_intensity", "task", "spread_intensity"]:
-                        if key in msg.metadata:
-                            copy_metadata[key] = msg.get_metadata(key)
+                original_sender = sender_jid
+
+            # 4. Copies for the monitoring agents
+            local = agent._local_nodes
+            dst_is_local = dst in local
+            if agent._has_monitors:
+                is_internal = dst_is_local and sender_jid in local
+                target_monitors = agent._fanout[is_internal]
+            else:
+                target_monitors = ()
+            sends = self._monitor_copies(msg, target_monitors, fw, original_sender, dst) if target_monitors else []
+
+            if dst_is_local:
+                # Local fast path: copies and delivery go out together, no settle wait or route lookup.
+                # A failed copy is ignored; a failed delivery still surfaces.
+                results = await asyncio.gather(*sends, self._deliver_local(msg, dst, fw, ttl_str, original_sender),
+                                               return_exceptions=True)
+                if isinstance(results[-1], Exception):
+                    raise results[-1]
+                return
 
-                if fw:
-                    await fw.send_through_firewall(m, copy_body, metadata=copy_metadata)
-                else:
-                    cm = Message(to=m)
-                    cm.body = copy_body
-                    for k, v in copy_metadata.items():
-                        cm.set_metadata(k, v)
-                    await self.send(cm)
-
-            # Small pause
-            await asyncio.sleep(0.3)
-
-            # 5. Forwarding decision
-            routing: Dict[str, str] = self.agent.get("routing_table") or {}
-
-            if dst in local:
-                # Direct delivery to a local node
-                out = Message(to=dst)
-                out.body = msg.body
-                out.set_metadata("via", str(self.agent.jid))
-                out.set_metadata("ttl", str(ttl))
-                out.set_metadata("original_sender", original_sender)
+            if sends:
+                # Fan out concurrently; one failed copy must not stop forwarding
+                await asyncio.gather(*sends, return_exceptions=True)
 
-                if msg.metadata:
-                    for key, value in msg.metadata.items():
-                        if key not in ["dst", "via", "ttl", "original_sender"]:
-                            out.set_metadata(key, value)
-
-                if fw:
-                    fw_metadata = {"via": str(self.agent.jid), "ttl": str(ttl),
-                                   "original_sender": original_sender}
-                    if msg.metadata:
-                        for key, value in msg.metadata.items():
-                            if key not in ["dst", "via", "ttl", "original_sender"]:
-                                fw_metadata[key] = value
-
-                    sent = await fw.send_through_firewall(dst, out.body, metadata=fw_metadata)
-                    if sent:
-                        _log("Router", str(self.agent.jid), f"Forwarded locally to {dst}")
-                    else:
-                        _log("Router", str(self.agent.jid), f"Firewall blocked forwarding to local {dst}")
-                else:
-                    await self.send(out)
-                    # Emit packet event for visualization
-                    viz = self.agent.get("_visualizer")
-                    if viz:
-                        viz.add_packet(str(self.agent.jid), dst)
-                return
+            # Give monitors a short window to push rule changes before forwarding:
+            # resume as soon as the firewall applies a control message, or after the cap.
+            if fw and target_monitors and agent.MONITOR_SETTLE_TIMEOUT:
+                try:
+                    await asyncio.wait_for(fw.rules_updated.wait(), timeout=agent.MONITOR_SETTLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass
 
-            # Intelligent routing (BFS)
-            next_hop = self.agent.find_best_path_bfs(dst)
+            # 5. Forwarding decision (memoized per destination)
+            is_local, next_hop = agent._resolve(dst)
 
-            # Fallback to simple static routing
-            if not next_hop:
-                next_hop = routing.get(dst)
-                if not next_hop:
-                    # Check for wildcard prefix match (e.g., routerX_*)
-                    for pat, nh in routing.items():
-                        if pat.endswith("*"):
-                            # Logic to match routerX_* to routerX_nodeY@domain
-                            dst_prefix = dst.split("@")[0].rsplit("_", 1)[0] if "_" in dst.split("@")[0] else dst.split("@")[0]
-                            pat_prefix = pat.rstrip("_*")
-                            if dst_prefix == pat_prefix:
-                                next_hop = nh
-                                break
+            if is_local:
+                # Node attached while we were waiting on the monitors
+                await self._deliver_local(msg, dst, fw, ttl_str, original_sender)
+                return
 
             if not next_hop:
-                _log("Router", str(self.agent.jid), f"No route for {dst}; dropping packet")
+                _log("Router", agent._jid_str, f"No route for {dst}; dropping packet")
                 return
 
             # Forward to next hop
-            _log("Router", str(self.agent.jid),
-                 f"[FWD] Forwarding to {next_hop.split('@')[0]} -> final dest: {dst.split('@')[0]}")
-            fwd_body = msg.body
+            _log("Router", agent._jid_str,
+                 f"[FWD] Forwarding to {_local(next_hop)} -> final dest: {_local(dst)}")
+            fwd_metadata = {"dst": dst, "via": agent._jid_str, "ttl": ttl_str,
+                            "original_sender": original_sender}
 
             # Outbound firewall check and send
             if fw:
-                sent_ok = await fw.send_through_firewall(next_hop, fwd_body,metadata={"dst": dst, "via": str(self.agent.jid),"ttl": str(ttl), "original_sender": original_sender})
+                sent_ok = await fw.send_through_firewall(next_hop, msg.body, metadata=fwd_metadata)
             else:
-                fwd = Message(to=next_hop)
-                fwd.body = fwd_body
-                fwd.set_metadata("dst", dst)
-                fwd.set_metadata("via", str(self.agent.jid))
-                fwd.set_metadata("ttl", str(ttl))
-                fwd.set_metadata("original_sender", original_sender)
-                await self.send(fwd)
+                await self.send(_build_fwd(next_hop, msg.body, fwd_metadata))
                 sent_ok = True
 
             if sent_ok:
-                _log("Router", str(self.agent.jid), f"Forwarded {dst} via next hop {next_hop}")
+                _log("Router", agent._jid_str, f"Forwarded {dst} via next hop {next_hop}")
             else:
-                _log("Router", str(self.agent.jid), f"Firewall prevented forwarding to {next_hop} for dst {dst}")
+                _log("Router", agent._jid_str, f"Firewall prevented forwarding to {next_hop} for dst {dst}")
+
+        def _monitor_copies(self, msg: Message, target_monitors, fw, original_sender: str, dst: str) -> list:
+            """Build the send coroutines for the monitor copies of `msg`.
+
+            Body and metadata are identical for every monitor, so they are built once.
+
+            Returns:
+                list: One awaitable per monitor, to be gathered by the caller.
+            """
+            copy_body = msg.body
+            copy_metadata = _COPY_META.copy()
+            copy_metadata["original_sender"] = original_sender
+            copy_metadata["original_destination"] = dst
+
+            # Preserve important attack metadata for monitoring
+            if msg.metadata:
+                for key in _COPY_KEYS:
+                    if key in msg.metadata:
+                        copy_metadata[key] = msg.get_metadata(key)
+
+            if fw:
+                fw.rules_updated.clear()
+                return [fw.send_through_firewall(m, copy_body, metadata=copy_metadata) for m in target_monitors]
+            # Message keeps the dict it is given, so each copy gets its own
+            return [self.send(_build_fwd(m, copy_body, copy_metadata.copy())) for m in target_monitors]
+
+        async def _deliver_local(self, msg: Message, dst: str, fw, ttl_str: str, original_sender: str):
+            """Deliver `msg` directly to a node attached to this router."""
+            agent = self.agent
+            out_metadata = {"via": agent._jid_str, "ttl": ttl_str,
+                            "original_sender": original_sender}
+            if msg.metadata:
+                for key, value in msg.metadata.items():
+                    if key not in _HOP_KEYS:
+                        out_metadata[key] = value
+
+            if fw:
+                sent = await fw.send_through_firewall(dst, msg.body, metadata=out_metadata)
+                if sent:
+                    _log("Router", agent._jid_str, f"Forwarded locally to {dst}")
+                else:
+                    _log("Router", agent._jid_str, f"Firewall blocked forwarding to local {dst}")
+            else:
+                await self.send(_build_fwd(dst, msg.body, out_metadata))
+                # Emit packet event for visualization
+                viz = agent.get("_visualizer")
+                if viz:
+                    viz.add_packet(agent._jid_str, dst)
 
     async def setup(self):
         """Initialize router agent and attach behaviours.
@@ -414,44 +699,56 @@ class RouterAgent(Agent):
         Sets up resource tracking, firewall, routing structures, and starts
         the main routing behaviours (`ResourceBehaviour` and `RouterBehav`).
         """
-        _log("Router", str(self.jid), "starting...")
+        _start_log_flusher()
+        _log("Router", self._jid_str, "starting...")
 
         # Initialize resource tracking
         self.set("cpu_usage", 15.0)
         self.set("bandwidth_usage", 8.0)
-        self.set("messages_routed", 0)
-        self.set("router_neighbors", {})
+        # router_neighbors is configured before start (environment.py); keep it
+        if not self.get("router_neighbors"):
+            self.set("router_neighbors", {})
+        self._adjacency[self._jid_str] = tuple(self.get("router_neighbors"))
 
         # attach a router-specific firewall behaviour and store reference
         fw = RouterFirewallBehaviour()
         self.add_behaviour(fw)
         self.set("firewall", fw)
+        self._fw = fw
 
         self.set("role", "router")
 
-        if not self.get("routing_table"):
-            self.set("routing_table", {})
-        if not self.get("local_nodes"):
-            self.set("local_nodes", set())
+        self.set("routing_table", self._routing_table)
+        # KV copy kept in sync for the firewall; the router itself reads _local_nodes
+        self.set("local_nodes", self._local_nodes)
         if not self.get("monitor_jids"):
             self.set("monitor_jids", [])
         if not self.get("internal_monitor_jids"):
             self.set("internal_monitor_jids", [])
+        self._rebuild_fanout()
 
         # Print current configuration
-        rt = self.get("routing_table") or {}
-        ln = self.get("local_nodes") or set()
+        rt = self._routing_table
+        ln = self._local_nodes
         monitors = self.get("monitor_jids") or []
         internal = self.get("internal_monitor_jids") or []
-        _log("Router", str(self.jid), "configuration:")
-        print(f"  local_nodes: {sorted(list(ln))}")
-        print(f"  routing_table: {rt}")
-        print(f"  monitors: {monitors}, internal_monitors: {internal}")
+        # One entry, so the body can never be flushed apart from its header
+        _log("Router", self._jid_str,
+             f"configuration:\n"
+             f"  local_nodes: {sorted(list(ln))}\n"
+             f"  routing_table: {rt}\n"
+             f"  monitors: {monitors}, internal_monitors: {internal}")
 
         # Start behaviours
         resource_behav = self.ResourceBehaviour(period=2.0)
         self.add_behaviour(resource_behav)
-        self.add_behaviour(self.RouterBehav())
+        adjacency_template = Template()
+        adjacency_template.set_metadata("protocol", "adjacency-sync")
+        self.add_behaviour(self.AdjacencyBehaviour(period=5.0), adjacency_template)
+        alert_template = Template()
+        alert_template.set_metadata("protocol", "threat-alert")
+        self.add_behaviour(self.ThreatAlertBehav(), alert_template)
+        self.add_behaviour(self.RouterBehav(), ~adjacency_template & ~alert_template)
 
     def add_route(self, dst_pattern: str, next_hop: str):
         """Add static route to routing table.
@@ -460,9 +757,15 @@ class RouterAgent(Agent):
             dst_pattern (str): Destination pattern (supports wildcard * for prefixes).
             next_hop (str): JID of next hop router.
         """
-        rt = self.get("routing_table") or {}
-        rt[dst_pattern] = next_hop
-        self.set("routing_table", rt)
+        dst_pattern = _intern(dst_pattern)
+        next_hop = _intern(next_hop)
+        self._routing_table[dst_pattern] = next_hop
+        self.set("routing_table", self._routing_table)
+        if dst_pattern.endswith("*"):
+            self._prefix_trie.insert(dst_pattern[:-1], next_hop)
+        else:
+            self._exact_routes[dst_pattern] = next_hop
+        self._bump_topology()
 
     def add_local_node(self, jid: str):
         """Register a node as directly attached to this router.
@@ -470,10 +773,11 @@ class RouterAgent(Agent):
         Args:
             jid (str): Node JID to add to local nodes.
         """
-        ln = self.get("local_nodes") or set()
-        ln.add(jid)
-        self.set("local_nodes", ln)
-        _log("Router", str(self.jid), f"node {jid} connected; local_nodes now: {sorted(list(ln))}")
+        jid = _intern(jid)
+        self._local_nodes = self._local_nodes | {jid}
+        self.set("local_nodes", self._local_nodes)
+        self._bump_topology()
+        _log("Router", self._jid_str, f"node {jid} connected; {len(self._local_nodes)} local nodes")
 
     def add_internal_monitor(self, jid: str):
         """Add monitor for intra-subnet traffic.
@@ -485,8 +789,20 @@ class RouterAgent(Agent):
             jid (str): Internal monitor JID.
         """
         ims = self.get("internal_monitor_jids") or []
-        ims.append(jid)
+        ims.append(_intern(jid))
         self.set("internal_monitor_jids", ims)
+        self._rebuild_fanout()
+
+    def _rebuild_fanout(self):
+        """Precompute monitor copy targets as (cross-subnet, intra-subnet) tuples.
+
+        Intra-subnet traffic goes to the internal monitors when any are
+        configured, otherwise to the regular monitors.
+        """
+        monitors = tuple(self.get("monitor_jids") or ())
+        internal = tuple(self.get("internal_monitor_jids") or ()) or monitors
+        self._fanout = (monitors, internal)
+        self._has_monitors = bool(monitors or internal)
 
 
 async def main():
@@ -504,6 +820,10 @@ async def main():
     parser.add_argument("--monitors", default="", help="Comma-separated monitoring agent JIDs")
     parser.add_argument("--internal-monitors", default="", help="Comma-separated internal monitoring agent JIDs")
     parser.add_argument("--no-auto-register", dest="auto_register", action="store_false", help="Disable auto_register")
+    parser.add_argument("--sim-delay-in", type=float, default=RouterAgent.SIM_DELAY_IN,
+                        help="Simulated per-packet processing delay in seconds (0 disables)")
+    parser.add_argument("--monitor-settle", type=float, default=RouterAgent.MONITOR_SETTLE_TIMEOUT,
+                        help="Max seconds to wait for monitor rule updates per packet (0 disables)")
     args = parser.parse_args()
 
     passwd = args.password or getpass.getpass()
@@ -512,6 +832,8 @@ async def main():
     internal_monitors = [p.strip() for p in args.internal_monitors.split(',') if p.strip()]
 
     agent = RouterAgent(args.jid, passwd)
+    agent.SIM_DELAY_IN = args.sim_delay_in
+    agent.MONITOR_SETTLE_TIMEOUT = args.monitor_settle
     agent.set("monitor_jids", monitors)
     agent.set("internal_monitor_jids", internal_monitors)
 